@@ -0,0 +1,123 @@
+"""
+Imaging work run in the API's process pool
+Pool workers are spawned and unpickle their entry points by module, so the
+entry points live here rather than in app.main: a worker imports only the
+imaging code, not the FastAPI app, job store and PubMed client
+"""
+
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from blake3 import blake3
+
+from .neuroimaging import process_uploaded_nifti
+
+
+logger = logging.getLogger(__name__)
+
+# (filename, content) pairs read from the request before the pipeline runs
+FileSnapshot = Tuple[str, bytes]
+
+
+def hash_files(files: List[FileSnapshot]) -> str:
+    """Content hash of the uploaded files (seeds the simulated features)"""
+    h = blake3()
+    for _, content in files:
+        # Scans are large enough for BLAKE3's multithreaded tree hashing
+        h.update(blake3(content, max_threads=blake3.AUTO).digest())
+    return h.hexdigest()
+
+
+_FORMAT_BY_SUFFIX = {"nii": "nifti", "dcm": "dicom", "dicom": "dicom"}
+
+def file_format(filename: str) -> str:
+    root, dot, ext = filename.lower().rpartition(".")
+    if not dot:
+        return "unknown"
+    if ext == "gz":
+        # Only gzipped NIfTI is accepted compressed (.nii.gz)
+        return "nifti" if root.endswith(".nii") else "unknown"
+    return _FORMAT_BY_SUFFIX.get(ext, "unknown")
+
+
+def process_nifti_bytes(content: bytes, suffix: str, meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Raw process_uploaded_nifti output for in-memory NIfTI bytes"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        tmp_file.write(content)
+        tmp_file_path = tmp_file.name
+    try:
+        results = process_uploaded_nifti(tmp_file_path, meta)
+    finally:
+        os.unlink(tmp_file_path)
+    if isinstance(results, dict) and "results" in results:
+        results = results["results"]
+    return results
+
+
+def compute_imaging_features(files: List[FileSnapshot], meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Process uploaded neuroimaging files using real NIFTI processing"""
+    nifti_file = next(((name, content) for name, content in files if file_format(name) == "nifti"), None)
+    if nifti_file is None:
+        return simulated_imaging_features(files, meta)
+
+    nifti_name, content = nifti_file
+    file_extension = '.nii.gz' if nifti_name.lower().endswith('.nii.gz') else '.nii'
+    try:
+        results = process_nifti_bytes(content, file_extension, meta)
+        return {
+            "hippocampal_volumes": results["hippocampal_volumes"],
+            "mta_score": results["mta_score"],
+            "thumbnails": results["thumbnails"],
+            "percentiles": results["percentiles"],
+            "brain_volumes": results["brain_volumes"],
+            "quality_metrics": results["quality_metrics"],
+            "file_info": results["file_info"],
+            "processing_type": "real_nifti"
+        }
+    except Exception:
+        logger.exception("Real NIFTI processing failed for %s (%d bytes)", nifti_name, len(content))
+        return simulated_imaging_features(files, meta)
+
+
+def _simulated_features_batch(ages: np.ndarray, seeds: np.ndarray) -> Dict[str, np.ndarray]:
+    """Vectorized simulated imaging features for arrays of ages and hash seeds"""
+    age_effect = np.maximum(0, (ages - 60) * 0.015)
+    l_vol = np.maximum(2.0, 3.8 - age_effect) + (seeds % 20) / 200.0
+    r_vol = np.maximum(2.0, 3.9 - age_effect) + ((seeds // 7) % 20) / 200.0
+    min_vol = np.minimum(l_vol, r_vol)
+    mta = np.where(ages < 65, 1, 2)
+    mta = np.maximum(mta, np.where(min_vol < 2.6, 3, 0))
+    mta = np.maximum(mta, np.where(min_vol < 2.3, 4, 0))
+    return {
+        "left_ml": l_vol,
+        "right_ml": r_vol,
+        "asymmetry_ml": np.abs(l_vol - r_vol),
+        "mta_score": mta,
+        "left_pct": np.maximum(1, (100 - (4.5 - l_vol) * 40).astype(int)),
+        "right_pct": np.maximum(1, (100 - (4.5 - r_vol) * 40).astype(int)),
+        "total_brain_ml": 1200 + seeds % 100,
+        "gray_matter_ml": 600 + seeds % 50,
+        "white_matter_ml": 500 + seeds % 30,
+    }
+
+def simulated_imaging_features(files: List[FileSnapshot], meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Fallback simulated imaging processing"""
+    seed = int(hash_files(files)[:8], 16) % 1000
+    age = int(meta.get("age", 70))
+    batch = _simulated_features_batch(np.array([age]), np.array([seed]))
+    f = {name: values[0].item() for name, values in batch.items()}
+    return {
+        "hippocampal_volumes": {"left_ml": round(f["left_ml"], 2), "right_ml": round(f["right_ml"], 2), "asymmetry_ml": round(f["asymmetry_ml"], 2)},
+        "mta_score": f["mta_score"],
+        "thumbnails": {"axial": None, "coronal": None, "sagittal": None},
+        "percentiles": {"left_pct": f["left_pct"], "right_pct": f["right_pct"]},
+        "brain_volumes": {
+            "total_brain_ml": round(f["total_brain_ml"], 1),
+            "gray_matter_ml": round(f["gray_matter_ml"], 1),
+            "white_matter_ml": round(f["white_matter_ml"], 1)
+        },
+        "processing_type": "simulated"
+    }
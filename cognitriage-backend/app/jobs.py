@@ -0,0 +1,114 @@
+"""
+Job state storage for the triage pipeline
+Keeps the working copy of each job in-process and, when REDIS_URL is set,
+publishes snapshots to Redis so any worker can answer status/result polls.
+Redis is reached through the asyncio client, so publishing and polling never
+block the event loop
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields
+from typing import Dict, Any, Optional
+
+import orjson
+from redis import asyncio as redis_asyncio
+
+
+@dataclass(slots=True)
+class Job:
+    """State of one triage pipeline run"""
+    status: str = "queued"
+    progress: int = 0
+    agents: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+
+
+_JOB_FIELDS = tuple(f.name for f in fields(Job))
+# Only jobs in these states have no pipeline writing to them any more
+_FINISHED_STATUSES = frozenset({"completed", "failed"})
+# Same encoding rules as the API's ORJSONResponse
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class JobStore:
+    """Job store with an in-process working copy and optional Redis backing
+
+    Finished local copies are dropped oldest-first once they outlive
+    ttl_seconds or the store holds more than max_jobs, so memory stays
+    bounded. Jobs still running are kept, since their pipeline writes to them.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, ttl_seconds: int = 24 * 3600, max_jobs: int = 10_000):
+        self._local: Dict[str, Job] = {}
+        self._created: "OrderedDict[str, float]" = OrderedDict()
+        self._redis = redis_asyncio.Redis.from_url(redis_url) if redis_url else None
+        # Concurrent agents save the same job; snapshots are published in the
+        # order they were taken so an older one never overwrites a newer one
+        self._publish_lock = asyncio.Lock()
+        self._ttl_seconds = ttl_seconds
+        self._max_jobs = max_jobs
+
+    async def add(self, job_id: str, job: Job) -> None:
+        """Register a new job and publish it"""
+        self._local[job_id] = job
+        self._created[job_id] = time.monotonic()
+        self._created.move_to_end(job_id)
+        self._evict()
+        await self.save(job_id)
+
+    def __getitem__(self, job_id: str) -> Job:
+        return self._local[job_id]
+
+    async def save(self, job_id: str) -> None:
+        """Publish the current working copy of a job (no-op without Redis)"""
+        if self._redis is None:
+            return
+        job = self._local[job_id]
+        key = f"job:{job_id}"
+        snapshot = {name: orjson.dumps(getattr(job, name), option=_ORJSON_OPTIONS) for name in _JOB_FIELDS}
+        async with self._publish_lock:
+            async with self._redis.pipeline() as pipe:
+                pipe.hset(key, mapping=snapshot)
+                pipe.expire(key, self._ttl_seconds)
+                await pipe.execute()
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        """Return the job from this process, falling back to Redis"""
+        self._evict()
+        job = self._local.get(job_id)
+        if job is not None or self._redis is None:
+            return job
+        raw = await self._redis.hgetall(f"job:{job_id}")
+        if not raw:
+            return None
+        values = {name.decode(): orjson.loads(value) for name, value in raw.items()}
+        return Job(**{name: values[name] for name in _JOB_FIELDS if name in values})
+
+    async def close(self) -> None:
+        """Release the Redis connection pool"""
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    def _evict(self) -> None:
+        expired_before = time.monotonic() - self._ttl_seconds
+        excess = len(self._created) - self._max_jobs
+        evicted = []
+        for job_id, created in self._created.items():
+            if excess <= 0 and created > expired_before:
+                break
+            if self._local[job_id].status in _FINISHED_STATUSES:
+                evicted.append(job_id)
+                excess -= 1
+        for job_id in evicted:
+            del self._created[job_id]
+            del self._local[job_id]
+
+
+def create_job_store() -> JobStore:
+    """Build the job store from the environment (REDIS_URL enables sharing)"""
+    return JobStore(redis_url=os.environ.get("REDIS_URL"))
@@ -5,32 +5,127 @@ Handles hippocampal volume extraction, brain segmentation, and MTA scoring
 
 import nibabel as nib
 import numpy as np
-from nilearn import datasets, image, plotting
-from nilearn.maskers import NiftiLabelsMasker
 from scipy import ndimage
-from skimage import measure, morphology
-import matplotlib.pyplot as plt
 import matplotlib
-matplotlib.use('Agg')  
+from PIL import Image
 import io
 import base64
 from typing import Dict, List, Tuple, Optional, Any
-import tempfile
 import os
-from pathlib import Path
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left
+
+# matplotlib's "hot" colormap as 8-bit RGB, indexed the way imshow maps
+# vmin=0..vmax=1 onto its 256 entries
+_HOT_LUT = matplotlib.colormaps["hot"](np.arange(256), bytes=True)[:, :3]
+
+
+def _png_base64(image: np.ndarray) -> str:
+    """PNG-encode an 8-bit grey or RGB image, rows ordered top to bottom, as base64"""
+    buffer = io.BytesIO()
+    Image.fromarray(np.ascontiguousarray(image)).save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+_encode_executor: Optional[ThreadPoolExecutor] = None
+_encode_executor_lock = threading.Lock()
+
+
+def _get_encode_executor() -> ThreadPoolExecutor:
+    """Thread pool for thumbnail encoding, created on first use
+
+    Pillow releases the GIL while compressing, so the six PNGs of a scan can
+    be encoded in parallel.
+    """
+    global _encode_executor
+    with _encode_executor_lock:
+        if _encode_executor is None:
+            _encode_executor = ThreadPoolExecutor(max_workers=min(6, os.cpu_count() or 1))
+        return _encode_executor
+
+
+# Heatmap smoothing; gaussian_filter's default truncate=4.0 limits the kernel
+# to int(4.0 * sigma + 0.5) voxels either side
+_HEATMAP_SIGMA = 1.0
+_HEATMAP_RADIUS = int(4.0 * _HEATMAP_SIGMA + 0.5)
+
+
+def _region_within(region: Tuple[slice, ...], window: List[slice], shape: Tuple[int, ...]) -> Tuple[slice, ...]:
+    """Translate a region of the full volume into the coordinates of a window into it"""
+    local = []
+    for axis, region_slice in enumerate(region):
+        span = range(shape[axis])[region_slice]
+        framed = range(shape[axis])[window[axis]]
+        start = max(span.start, framed.start)
+        stop = min(span.stop, framed.stop)
+        local.append(slice(start - framed.start, max(start, stop) - framed.start))
+    return tuple(local)
+
+
+# Smallest hippocampal volume (ml) each MTA grade must exceed, in ascending
+# order: 4 very severe, 3 severe, 2 moderate, 1 mild, 0 no atrophy
+_MTA_CUTOFFS = (2.0, 2.5, 3.0, 3.5)
+
+
+def _hippocampus_rois(shape: Tuple[int, ...]) -> Tuple[Tuple[slice, ...], Tuple[slice, ...]]:
+    """Left and right hippocampal boxes around the centre of a volume of the given shape"""
+    y_center = shape[1] // 2
+    z_center = shape[2] // 2
+    around = slice(y_center-20, y_center+10), slice(z_center-15, z_center+15)
+    left = (slice(None, shape[0]//2),) + around
+    right = (slice(shape[0]//2, None),) + around
+    return left, right
+
+
+def _edge_shell(data: np.ndarray, thickness: int) -> List[np.ndarray]:
+    """Disjoint slabs covering every voxel within `thickness` of a face of the first three axes"""
+    slabs = []
+    inner = [slice(None)] * data.ndim
+    for axis in range(3):
+        size = data.shape[axis]
+        for face in (slice(0, thickness), slice(max(thickness, size - thickness), size)):
+            window = list(inner)
+            window[axis] = face
+            slabs.append(data[tuple(window)])
+        # Later axes skip the rows already covered by this axis' faces
+        inner[axis] = slice(thickness, max(thickness, size - thickness))
+    return slabs
+
 
 class NeuroimagingProcessor:
     """Real neuroimaging processing for cognitive triage"""
     
-    def __init__(self):
-        self.atlas_data = None
-        self.atlas_labels = None
-        self._load_atlas()
+    # The atlas is fetched once per process and shared by every instance
+    _atlas_lock = threading.Lock()
+    _atlas_attempted = False
+    _shared_atlas_data = None
+    _shared_atlas_labels = None
+    
+    def __init__(self, load_atlas: bool = False):
+        # Hippocampal volumes are estimated from intensities and never read the
+        # atlas, so the download is opt-in rather than paid on every cold start
+        if load_atlas:
+            self._load_atlas()
+        self.atlas_data = NeuroimagingProcessor._shared_atlas_data
+        self.atlas_labels = NeuroimagingProcessor._shared_atlas_labels
     
     def _load_atlas(self):
         """Load Harvard-Oxford atlas for hippocampal segmentation"""
+        with NeuroimagingProcessor._atlas_lock:
+            # A failed fetch is not retried either: it would repeat the
+            # download timeouts on every upload
+            if NeuroimagingProcessor._atlas_attempted:
+                return
+            NeuroimagingProcessor._atlas_attempted = True
+            self._fetch_atlas()
+    
+    def _fetch_atlas(self):
+        """Fetch the atlas into the class-level cache"""
         try:
-            # Load Harvard-Oxford subcortical atlas with timeout
+            # Load Harvard-Oxford subcortical atlas with timeout; nilearn is
+            # only imported here, as plain uploads never need it
+            from nilearn import datasets
             import requests
             from requests.adapters import HTTPAdapter
             from urllib3.util.retry import Retry
@@ -45,13 +140,13 @@ class NeuroimagingProcessor:
             os.environ['NILEARN_DOWNLOAD_TIMEOUT'] = '10'
             
             atlas = datasets.fetch_atlas_harvard_oxford('sub-maxprob-thr25-2mm')
-            self.atlas_data = atlas.maps
-            self.atlas_labels = atlas.labels
+            NeuroimagingProcessor._shared_atlas_data = atlas.maps
+            NeuroimagingProcessor._shared_atlas_labels = atlas.labels
             print("Successfully loaded Harvard-Oxford atlas")
         except Exception as e:
             print(f"Warning: Could not load atlas, using fallback processing: {e}")
-            self.atlas_data = None
-            self.atlas_labels = None
+            NeuroimagingProcessor._shared_atlas_data = None
+            NeuroimagingProcessor._shared_atlas_labels = None
     
     def process_nifti_file(self, file_path: str, patient_meta: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -67,16 +162,41 @@ class NeuroimagingProcessor:
         try:
             # Load NIFTI file
             img = nib.load(file_path)
-            
+            # The shape checks only need the header, so a rejected file is
+            # never decoded
             self._validate_nifti(img)
             
+            # Decode and scale the volume once; every helper works on this array.
+            # float32 is ample for scanner intensities and halves the memory
+            # traffic of every reduction compared with get_fdata()'s float64
+            data = np.asarray(img.dataobj, dtype=np.float32)
+            zooms = img.header.get_zooms()[:3]
+            
+            # Full-volume extremes, taken once for validation, logging and the
+            # quality report
+            value_range = (np.min(data), np.max(data))
+            self._validate_intensities(value_range)
+            
+            # The estimator and the abnormality detector read the same boxes
+            hippocampus_rois = _hippocampus_rois(data.shape)
+            
+            hippocampal_volumes = self._extract_hippocampal_volumes(data, zooms, hippocampus_rois, patient_meta)
+            # MTA is scored on the unscaled estimate, which only differs from the
+            # reported volumes when the pathology demo scaling is applied
+            if patient_meta.get("pathology_demo"):
+                mta_volumes = self._extract_hippocampal_volumes(data, zooms, hippocampus_rois, {})
+            else:
+                mta_volumes = hippocampal_volumes
+            
+            intensity = self._intensity_statistics(data, value_range)
+            
             results = {
                 "file_info": self._get_file_info(img),
-                "hippocampal_volumes": self._extract_hippocampal_volumes(img, patient_meta),
-                "brain_volumes": self._calculate_brain_volumes(img),
-                "mta_score": self._calculate_mta_score(img),
-                "thumbnails": self._generate_thumbnails(img),
-                "quality_metrics": self._assess_image_quality(img)
+                "hippocampal_volumes": hippocampal_volumes,
+                "brain_volumes": self._calculate_brain_volumes(data, zooms, intensity),
+                "mta_score": self._calculate_mta_score(mta_volumes),
+                "thumbnails": self._generate_thumbnails(data, intensity, hippocampus_rois),
+                "quality_metrics": self._assess_image_quality(data, intensity)
             }
             
             results["percentiles"] = self._calculate_percentiles(
@@ -90,52 +210,47 @@ class NeuroimagingProcessor:
             raise ValueError(f"Error processing NIFTI file: {str(e)}")
     
     def _validate_nifti(self, img: nib.Nifti1Image) -> None:
-        """Validate NIFTI file structure and content"""
-        data = img.get_fdata()
-        
-        if len(data.shape) < 3:
+        """Validate NIFTI file structure from its header"""
+        shape = img.shape
+        if len(shape) < 3:
             raise ValueError("NIFTI file must be 3D or 4D")
         
-        print(f"NIFTI dimensions: {data.shape}")
-        if any(dim < 10 or dim > 1000 for dim in data.shape[:3]):
-            print(f"Rejecting file with dimensions: {data.shape[:3]}")
+        print(f"NIFTI dimensions: {shape}")
+        if any(dim < 10 or dim > 1000 for dim in shape[:3]):
+            print(f"Rejecting file with dimensions: {shape[:3]}")
             raise ValueError("Unusual brain dimensions detected")
-        
-        if np.max(data) <= 0:
+    
+    def _validate_intensities(self, value_range: Tuple[float, float]) -> None:
+        """Validate NIFTI content from the (min, max) of the whole volume"""
+        if value_range[1] <= 0:
             raise ValueError("Invalid intensity values in NIFTI file")
     
     def _get_file_info(self, img: nib.Nifti1Image) -> Dict[str, Any]:
-        """Extract basic file information"""
+        """Extract basic file information from the header"""
         header = img.header
-        data = img.get_fdata()
+        shape = img.shape
+        zooms = header.get_zooms()[:3]
         
         return {
-            "dimensions": list(data.shape),
-            "voxel_size": [float(x) for x in header.get_zooms()[:3]],
+            "dimensions": list(shape),
+            "voxel_size": [float(x) for x in zooms],
             "data_type": str(header.get_data_dtype()),
             "orientation": list(nib.aff2axcodes(img.affine)),
-            "volume_ml": float(np.prod(header.get_zooms()[:3]) * np.prod(data.shape[:3]) / 1000)
+            "volume_ml": float(np.prod(zooms) * np.prod(shape[:3]) / 1000)
         }
     
-    def _extract_hippocampal_volumes(self, img: nib.Nifti1Image, patient_meta: Dict[str, Any]) -> Dict[str, float]:
+    def _extract_hippocampal_volumes(self, data: np.ndarray, zooms: Tuple[float, ...], hippocampus_rois: Tuple[Tuple[slice, ...], Tuple[slice, ...]], patient_meta: Dict[str, Any]) -> Dict[str, float]:
         """Extract hippocampal volumes using atlas-based segmentation"""
         print("Using intensity-based hippocampal volume estimation")
-        return self._estimate_hippocampus_intensity_based(img, patient_meta)
+        return self._estimate_hippocampus_intensity_based(data, zooms, hippocampus_rois, patient_meta)
     
-    def _estimate_hippocampus_intensity_based(self, img: nib.Nifti1Image, patient_meta: Dict[str, Any] = None) -> Dict[str, float]:
+    def _estimate_hippocampus_intensity_based(self, data: np.ndarray, zooms: Tuple[float, ...], hippocampus_rois: Tuple[Tuple[slice, ...], Tuple[slice, ...]], patient_meta: Dict[str, Any] = None) -> Dict[str, float]:
         """Fallback hippocampus estimation using intensity and morphology"""
-        data = img.get_fdata()
-        voxel_volume = np.prod(img.header.get_zooms()[:3]) / 1000  # ml
+        voxel_volume = np.prod(zooms) / 1000  # ml
         
-        y_center = data.shape[1] // 2
-        z_center = data.shape[2] // 2
-        
-        left_region = data[:data.shape[0]//2, 
-                                 y_center-20:y_center+10, 
-                                 z_center-15:z_center+15]
-        right_region = data[data.shape[0]//2:, 
-                                  y_center-20:y_center+10, 
-                                  z_center-15:z_center+15]
+        left_slices, right_slices = hippocampus_rois
+        left_region = data[left_slices]
+        right_region = data[right_slices]
         
         left_volume = np.sum(left_region > np.percentile(left_region, 50)) * voxel_volume * 0.001
         right_volume = np.sum(right_region > np.percentile(right_region, 50)) * voxel_volume * 0.001
@@ -154,76 +269,81 @@ class NeuroimagingProcessor:
             "total_ml": float(round(left_volume + right_volume, 2))
         }
     
-    def _calculate_brain_volumes(self, img: nib.Nifti1Image) -> Dict[str, float]:
+    def _intensity_statistics(self, data: np.ndarray, value_range: Tuple[float, float]) -> Dict[str, Any]:
+        """Voxel selections shared by the volume, abnormality and quality helpers
+        
+        Each helper used to rebuild the positive-voxel mask, the 10th percentile
+        brain threshold and the brain mask on its own; they are computed once here
+        and carried with the volume's (min, max).
+        """
+        positive = data[data > 0]
+        brain_threshold = np.percentile(positive, 10)
+        # The threshold is at least the smallest positive value, so the brain
+        # voxels (in the same order) can be drawn from the positive ones
+        # without a second volume-sized mask
+        return {
+            "value_range": value_range,
+            "positive": positive,
+            "brain_threshold": brain_threshold,
+            "brain_data": positive[positive > brain_threshold],
+        }
+    
+    def _calculate_brain_volumes(self, data: np.ndarray, zooms: Tuple[float, ...], intensity: Dict[str, Any]) -> Dict[str, float]:
         """Calculate total brain, gray matter, white matter volumes"""
-        data = img.get_fdata()
-        voxel_volume = np.prod(img.header.get_zooms()[:3]) / 1000  # ml
+        # A Python float, so voxel counts scale in double rather than float32
+        voxel_volume = float(np.prod(zooms) / 1000)  # ml
         
-        brain_mask = data > np.percentile(data[data > 0], 10)
-        total_brain = np.sum(brain_mask) * voxel_volume
+        total_brain = intensity["brain_data"].size * voxel_volume
         
-        high_intensity = np.percentile(data[brain_mask], 80)
-        low_intensity = np.percentile(data[brain_mask], 40)
+        # One partition of the brain voxels serves both cut points
+        brain_data = intensity["brain_data"]
+        high_intensity, low_intensity = np.percentile(brain_data, [80, 40])
         
-        white_matter = data > high_intensity
-        gray_matter = (data > low_intensity) & (data <= high_intensity)
+        # Both cut points are brain intensities, so every voxel above them is
+        # already among the brain voxels and the counts need no volume masks
+        white_matter = np.count_nonzero(brain_data > high_intensity)
+        gray_matter = np.count_nonzero(brain_data > low_intensity) - white_matter
         
         return {
             "total_brain_ml": float(round(total_brain, 1)),
-            "gray_matter_ml": float(round(np.sum(gray_matter) * voxel_volume, 1)),
-            "white_matter_ml": float(round(np.sum(white_matter) * voxel_volume, 1)),
+            "gray_matter_ml": float(round(gray_matter * voxel_volume, 1)),
+            "white_matter_ml": float(round(white_matter * voxel_volume, 1)),
             "brain_mask_volume_ml": float(round(total_brain, 1))
         }
     
-    def _calculate_mta_score(self, img: nib.Nifti1Image) -> int:
+    def _calculate_mta_score(self, hippocampal_volumes: Dict[str, float]) -> int:
         """Calculate medial temporal atrophy (MTA) score"""
-        
-        hippocampal_volumes = self._extract_hippocampal_volumes(img, {})
         min_volume = min(hippocampal_volumes["left_ml"], hippocampal_volumes["right_ml"])
         
-        if min_volume > 3.5:
-            return 0  # No atrophy
-        elif min_volume > 3.0:
-            return 1  # Mild atrophy
-        elif min_volume > 2.5:
-            return 2  # Moderate atrophy
-        elif min_volume > 2.0:
-            return 3  # Severe atrophy
-        else:
-            return 4  # Very severe atrophy
+        # Each cutoff the volume strictly exceeds lowers the grade by one
+        return len(_MTA_CUTOFFS) - bisect_left(_MTA_CUTOFFS, min_volume)
     
-    def _generate_thumbnails(self, img: nib.Nifti1Image) -> Dict[str, Optional[str]]:
+    def _generate_thumbnails(self, data: np.ndarray, intensity: Dict[str, Any], hippocampus_rois: Tuple[Tuple[slice, ...], Tuple[slice, ...]]) -> Dict[str, Optional[str]]:
         """Generate base64-encoded thumbnail images with heatmap overlays"""
         try:
-            data = img.get_fdata()
             print(f"Generating thumbnails for image with shape: {data.shape}")
-            print(f"Data type: {data.dtype}, min: {np.min(data)}, max: {np.max(data)}")
+            data_min, data_max = intensity["value_range"]
+            print(f"Data type: {data.dtype}, min: {data_min}, max: {data_max}")
             print(f"Non-zero values: {np.count_nonzero(data)}")
             
-            abnormality_map = self._detect_abnormalities(img)
+            heatmaps = self._detect_abnormalities(data, intensity, hippocampus_rois)
             
-            thumbnails = {}
-            
-            axial_slice = data[:, :, data.shape[2] // 2]
-            axial_heatmap = abnormality_map[:, :, data.shape[2] // 2]
-            print(f"Axial slice shape: {axial_slice.shape}, min: {np.min(axial_slice)}, max: {np.max(axial_slice)}")
-            thumbnails["axial"] = self._array_to_base64(axial_slice)
-            thumbnails["axial_heatmap"] = self._heatmap_to_base64(axial_heatmap)
-            print(f"Generated axial thumbnail: {'SUCCESS' if thumbnails['axial'] else 'FAILED'}")
+            views = (
+                ("axial", data[:, :, data.shape[2] // 2], heatmaps[2]),
+                ("coronal", data[:, data.shape[1] // 2, :], heatmaps[1]),
+                ("sagittal", data[data.shape[0] // 2, :, :], heatmaps[0]),
+            )
             
-            coronal_slice = data[:, data.shape[1] // 2, :]
-            coronal_heatmap = abnormality_map[:, data.shape[1] // 2, :]
-            print(f"Coronal slice shape: {coronal_slice.shape}, min: {np.min(coronal_slice)}, max: {np.max(coronal_slice)}")
-            thumbnails["coronal"] = self._array_to_base64(coronal_slice)
-            thumbnails["coronal_heatmap"] = self._heatmap_to_base64(coronal_heatmap)
-            print(f"Generated coronal thumbnail: {'SUCCESS' if thumbnails['coronal'] else 'FAILED'}")
+            executor = _get_encode_executor()
+            pending = {}
+            for view, view_slice, view_heatmap in views:
+                print(f"{view.capitalize()} slice shape: {view_slice.shape}, min: {np.min(view_slice)}, max: {np.max(view_slice)}")
+                pending[view] = executor.submit(self._array_to_base64, view_slice)
+                pending[f"{view}_heatmap"] = executor.submit(self._heatmap_to_base64, view_heatmap)
             
-            sagittal_slice = data[data.shape[0] // 2, :, :]
-            sagittal_heatmap = abnormality_map[data.shape[0] // 2, :, :]
-            print(f"Sagittal slice shape: {sagittal_slice.shape}, min: {np.min(sagittal_slice)}, max: {np.max(sagittal_slice)}")
-            thumbnails["sagittal"] = self._array_to_base64(sagittal_slice)
-            thumbnails["sagittal_heatmap"] = self._heatmap_to_base64(sagittal_heatmap)
-            print(f"Generated sagittal thumbnail: {'SUCCESS' if thumbnails['sagittal'] else 'FAILED'}")
+            thumbnails = {key: future.result() for key, future in pending.items()}
+            for view, _, _ in views:
+                print(f"Generated {view} thumbnail: {'SUCCESS' if thumbnails[view] else 'FAILED'}")
             
             return thumbnails
             
@@ -233,54 +353,66 @@ class NeuroimagingProcessor:
             traceback.print_exc()
             return {"axial": None, "coronal": None, "sagittal": None}
     
-    def _detect_abnormalities(self, img: nib.Nifti1Image) -> np.ndarray:
-        """Detect potential abnormalities and generate heatmap"""
-        data = img.get_fdata()
-        abnormality_map = np.zeros_like(data)
-        
-        brain_mask = data > np.percentile(data[data > 0], 10)
-        mean_intensity = np.mean(data[brain_mask])
-        std_intensity = np.std(data[brain_mask])
-        
-        # High intensity abnormalities 
-        high_abnormal = data > (mean_intensity + 2.5 * std_intensity)
-        abnormality_map[high_abnormal] = 0.8
-        
-        # Low intensity abnormalities
-        low_abnormal = (data < (mean_intensity - 1.5 * std_intensity)) & brain_mask
-        abnormality_map[low_abnormal] = 0.6
-        
-        y_center = data.shape[1] // 2
-        z_center = data.shape[2] // 2
+    def _detect_abnormalities(self, data: np.ndarray, intensity: Dict[str, Any], hippocampus_rois: Tuple[Tuple[slice, ...], Tuple[slice, ...]]) -> Dict[int, np.ndarray]:
+        """Detect potential abnormalities and return the heatmap through the middle slice of each axis"""
+        brain_threshold = intensity["brain_threshold"]
+        mean_intensity = np.mean(intensity["brain_data"])
+        std_intensity = np.std(intensity["brain_data"])
+        high_threshold = mean_intensity + 2.5 * std_intensity
+        low_threshold = mean_intensity - 1.5 * std_intensity
         
-        left_hippo_region = slice(None, data.shape[0]//2), slice(y_center-20, y_center+10), slice(z_center-15, z_center+15)
+        left_hippo_region, right_hippo_region = hippocampus_rois
         left_hippo_data = data[left_hippo_region]
         left_hippo_mean = np.mean(left_hippo_data[left_hippo_data > 0])
         
-        right_hippo_region = slice(data.shape[0]//2, None), slice(y_center-20, y_center+10), slice(z_center-15, z_center+15)
         right_hippo_data = data[right_hippo_region]
         right_hippo_mean = np.mean(right_hippo_data[right_hippo_data > 0])
         
+        atrophy_region = None
         if abs(left_hippo_mean - right_hippo_mean) > 0.2 * max(left_hippo_mean, right_hippo_mean):
-            if left_hippo_mean < right_hippo_mean:
-                abnormality_map[left_hippo_region] = np.maximum(abnormality_map[left_hippo_region], 0.7)
-            else:
-                abnormality_map[right_hippo_region] = np.maximum(abnormality_map[right_hippo_region], 0.7)
+            atrophy_region = left_hippo_region if left_hippo_mean < right_hippo_mean else right_hippo_region
         
-        abnormality_map = ndimage.gaussian_filter(abnormality_map, sigma=1.0)
+        # Only the three middle slices are ever displayed, and the smoothed value
+        # of a slice depends on _HEATMAP_RADIUS neighbours either side, so the map
+        # is built and filtered for those slabs instead of the whole volume
+        heatmaps = {}
+        for axis in range(3):
+            center = data.shape[axis] // 2
+            start = max(0, center - _HEATMAP_RADIUS)
+            window = [slice(None)] * data.ndim
+            window[axis] = slice(start, center + _HEATMAP_RADIUS + 1)
+            slab = data[tuple(window)]
+            
+            abnormality_map = np.zeros_like(slab)
+            
+            # High intensity abnormalities 
+            abnormality_map[slab > high_threshold] = 0.8
+            
+            # Low intensity abnormalities
+            abnormality_map[(slab < low_threshold) & (slab > brain_threshold)] = 0.6
+            
+            if atrophy_region is not None:
+                roi = abnormality_map[_region_within(atrophy_region, window, data.shape)]
+                np.maximum(roi, 0.7, out=roi)
+            
+            abnormality_map = ndimage.gaussian_filter(abnormality_map, sigma=_HEATMAP_SIGMA)
+            
+            middle = [slice(None)] * data.ndim
+            middle[axis] = center - start
+            heatmaps[axis] = abnormality_map[tuple(middle)]
         
-        return abnormality_map
+        return heatmaps
     
-    def _assess_image_quality(self, img: nib.Nifti1Image) -> Dict[str, Any]:
+    def _assess_image_quality(self, data: np.ndarray, intensity: Dict[str, Any]) -> Dict[str, Any]:
         """Assess basic image quality metrics"""
         try:
-            data = img.get_fdata()
-            print(f"Quality assessment - data shape: {data.shape}, min: {np.min(data)}, max: {np.max(data)}")
+            data_min, data_max = intensity["value_range"]
+            print(f"Quality assessment - data shape: {data.shape}, min: {data_min}, max: {data_max}")
             
-            brain_mask = data > 0
-            print(f"Quality assessment - brain voxels: {np.sum(brain_mask)}")
+            brain_data = intensity["positive"]
+            print(f"Quality assessment - brain voxels: {brain_data.size}")
             
-            if not np.any(brain_mask):
+            if brain_data.size == 0:
                 print("Quality assessment - no brain data found")
                 return {
                     "snr": 0.0,
@@ -289,25 +421,21 @@ class NeuroimagingProcessor:
                     "quality_score": "poor"
                 }
             
-            brain_data = data[brain_mask]
-            signal = np.mean(brain_data)
+            # Accumulate in float64 so the reported statistics stay plain doubles
+            signal = np.mean(brain_data, dtype=np.float64)
             print(f"Quality assessment - signal: {signal}")
             
             edge_thickness = 5
-            background_mask = np.zeros_like(data, dtype=bool)
-            background_mask[:edge_thickness, :, :] = True
-            background_mask[-edge_thickness:, :, :] = True
-            background_mask[:, :edge_thickness, :] = True
-            background_mask[:, -edge_thickness:, :] = True
-            background_mask[:, :, :edge_thickness] = True
-            background_mask[:, :, -edge_thickness:] = True
-            
-            background_mask = background_mask & ~brain_mask
-            
-            if np.any(background_mask):
-                noise = np.std(data[background_mask])
+            # Non-brain voxels of the edge shell, gathered slab by slab rather
+            # than through a volume-sized mask
+            background = np.concatenate([
+                slab[~(slab > 0)] for slab in _edge_shell(data, edge_thickness)
+            ])
+            
+            if background.size:
+                noise = np.std(background, dtype=np.float64)
             else:
-                noise = np.std(brain_data[brain_data < np.percentile(brain_data, 10)])
+                noise = np.std(brain_data[brain_data < np.percentile(brain_data, 10)], dtype=np.float64)
             
             print(f"Quality assessment - noise: {noise}")
             
@@ -326,7 +454,7 @@ class NeuroimagingProcessor:
             result = {
                 "snr": float(round(snr, 1)),
                 "mean_intensity": float(round(signal, 1)),
-                "intensity_range": [float(round(np.min(data), 1)), float(round(np.max(data), 1))],
+                "intensity_range": [round(float(data_min), 1), round(float(data_max), 1)],
                 "quality_score": quality_score
             }
             print(f"Quality assessment - final result: {result}")
@@ -356,25 +484,19 @@ class NeuroimagingProcessor:
             if rng <= 0:
                 normalized = np.zeros_like(arr, dtype=np.uint8)
             else:
-                normalized = ((arr - a_min) / rng * 255).astype(np.uint8)
-
-            plt.figure(figsize=(4, 4))
-            
-            plt.imshow(normalized.T, cmap='gray', origin='lower', vmin=0, vmax=255)
-            
-            plt.axis('off')
+                # Scaled in place on the nan_to_num copy, in the original
+                # order of operations so the truncated levels are unchanged
+                np.subtract(arr, a_min, out=arr)
+                np.divide(arr, rng, out=arr)
+                np.multiply(arr, 255, out=arr)
+                normalized = arr.astype(np.uint8)
 
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png', bbox_inches='tight', dpi=100, pad_inches=0)
-            buffer.seek(0)
-
-            image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            plt.close()
-
-            return image_base64
+            # Encoded at native resolution; transposed and flipped so the first
+            # axis runs left to right and the second bottom to top, as imshow
+            # drew it with origin='lower'
+            return _png_base64(normalized.T[::-1])
         except Exception as e:
             print(f"Error creating base64 image: {e}")
-            plt.close()
             return None
     
     def _heatmap_to_base64(self, heatmap: np.ndarray) -> Optional[str]:
@@ -382,40 +504,30 @@ class NeuroimagingProcessor:
         try:
             heatmap_normalized = np.nan_to_num(heatmap, nan=0.0)
             
-            plt.figure(figsize=(4, 4))
-            
-            plt.imshow(heatmap_normalized.T, cmap='hot', origin='lower', vmin=0, vmax=1.0)
-            
-            plt.axis('off')
-
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png', bbox_inches='tight', dpi=100, pad_inches=0)
-            buffer.seek(0)
-
-            image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            plt.close()
-
-            return image_base64
+            lut_index = np.clip(heatmap_normalized * len(_HOT_LUT), 0, len(_HOT_LUT) - 1).astype(np.uint8)
+            return _png_base64(_HOT_LUT[lut_index.T[::-1]])
         except Exception as e:
             print(f"Error creating base64 heatmap: {e}")
-            plt.close()
             return None
     
     def _calculate_percentiles(self, volumes: Dict[str, float], patient_meta: Dict[str, Any]) -> Dict[str, int]:
         """Calculate percentiles based on normative data"""
-        age = int(patient_meta.get("age", 70))
-        
-        expected_left = 4.2 - (age - 60) * 0.02  # Age-related decline
-        expected_right = 4.3 - (age - 60) * 0.02
-        
-        left_percentile = max(1, min(99, int(100 * volumes["left_ml"] / expected_left)))
-        right_percentile = max(1, min(99, int(100 * volumes["right_ml"] / expected_right)))
-        
-        return {
-            "left_pct": left_percentile,
-            "right_pct": right_percentile,
-            "mean_pct": (left_percentile + right_percentile) // 2
-        }
+        return hippocampal_percentiles(volumes["left_ml"], volumes["right_ml"], int(patient_meta.get("age", 70)))
+
+
+def hippocampal_percentiles(left_ml: float, right_ml: float, age: int) -> Dict[str, int]:
+    """Percentiles of left and right hippocampal volumes against age-adjusted normative data"""
+    expected_left = 4.2 - (age - 60) * 0.02  # Age-related decline
+    expected_right = 4.3 - (age - 60) * 0.02
+    
+    left_percentile = max(1, min(99, int(100 * left_ml / expected_left)))
+    right_percentile = max(1, min(99, int(100 * right_ml / expected_right)))
+    
+    return {
+        "left_pct": left_percentile,
+        "right_pct": right_percentile,
+        "mean_pct": (left_percentile + right_percentile) // 2
+    }
 
 
 def process_uploaded_nifti(file_path: str, patient_meta: Dict[str, Any]) -> Dict[str, Any]:
@@ -429,5 +541,17 @@ def process_uploaded_nifti(file_path: str, patient_meta: Dict[str, Any]) -> Dict
     Returns:
         Processed neuroimaging features
     """
-    processor = NeuroimagingProcessor()
-    return processor.process_nifti_file(file_path, patient_meta)
+    return _get_processor().process_nifti_file(file_path, patient_meta)
+
+
+_processor: Optional[NeuroimagingProcessor] = None
+_processor_lock = threading.Lock()
+
+
+def _get_processor() -> NeuroimagingProcessor:
+    """Process-wide processor, built on first use"""
+    global _processor
+    with _processor_lock:
+        if _processor is None:
+            _processor = NeuroimagingProcessor(load_atlas=False)
+        return _processor
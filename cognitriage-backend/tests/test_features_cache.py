@@ -0,0 +1,49 @@
+import pytest
+
+from app import main
+from app.imaging_worker import simulated_imaging_features
+
+
+META = {"age": 70}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    main._features_cache.clear()
+    yield
+    main._features_cache.clear()
+
+
+@pytest.fixture
+def imaging_calls(monkeypatch):
+    """Run imaging in-process, recording each call; queued outcomes are returned first"""
+    calls, outcomes = [], []
+
+    def run_imaging(fn, files, meta):
+        calls.append([name for name, _ in files])
+        return outcomes.pop(0) if outcomes else fn(files, meta)
+
+    monkeypatch.setattr(main, "_run_imaging", run_imaging)
+    return calls, outcomes
+
+
+def test_simulated_fallback_for_nifti_is_not_cached(imaging_calls):
+    calls, outcomes = imaging_calls
+    files = [("scan.nii.gz", b"not really gzip")]
+    real = {"hippocampal_volumes": {"left_ml": 3.1, "right_ml": 3.2}, "processing_type": "real_nifti"}
+    outcomes.extend([simulated_imaging_features(files, META), real])
+
+    assert main._imaging_features(files, META)["processing_type"] == "simulated"
+    assert main._imaging_features(files, META) == real
+    assert main._imaging_features(files, META) == real
+    assert len(calls) == 2
+
+
+def test_uploads_without_nifti_are_cached(imaging_calls):
+    calls, _ = imaging_calls
+    files = [("report.dcm", b"dicom bytes")]
+
+    first = main._imaging_features(files, META)
+    assert first["processing_type"] == "simulated"
+    assert main._imaging_features(files, META) == first
+    assert len(calls) == 1
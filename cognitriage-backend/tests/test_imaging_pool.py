@@ -0,0 +1,37 @@
+import os
+import signal
+import time
+
+import pytest
+
+from app import main
+from app.imaging_worker import simulated_imaging_features
+
+
+FILES = [("scan.nii.gz", b"\x00" * 64)]
+META = {"age": 70}
+
+
+@pytest.fixture
+def fresh_pool():
+    main._imaging_executor = None
+    yield
+    if main._imaging_executor is not None:
+        main._imaging_executor.shutdown(cancel_futures=True)
+        main._imaging_executor = None
+
+
+def test_killed_worker_does_not_break_later_jobs(fresh_pool):
+    expected = simulated_imaging_features(FILES, META)
+    assert main._run_imaging(simulated_imaging_features, FILES, META) == expected
+
+    pool = main._imaging_executor
+    for pid in list(pool._processes):
+        os.kill(pid, signal.SIGKILL)
+    deadline = time.monotonic() + 10
+    while not pool._broken and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert pool._broken
+
+    assert main._run_imaging(simulated_imaging_features, FILES, META) == expected
+    assert main._imaging_executor is not pool
@@ -0,0 +1,145 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app import jobs as jobs_module
+from app.jobs import Job, JobStore
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    """Point every JobStore's Redis client at one shared in-memory server"""
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        jobs_module.redis_asyncio.Redis,
+        "from_url",
+        lambda url: fakeredis.FakeAsyncRedis(server=server),
+    )
+    return server
+
+
+def test_save_get_round_trip_keeps_field_types(redis_server):
+    async def scenario():
+        writer = JobStore(redis_url="redis://test")
+        reader = JobStore(redis_url="redis://test")
+        job = Job(status="running", progress=45)
+        job.agents["Imaging_Feature_Agent"] = {"status": "done", "output": {"mta_score": np.int64(3)}}
+        job.result = {"hippocampal_volumes": {"left_ml": np.float64(2.75)}}
+        await writer.add("job-1", job)
+        loaded = await reader.get("job-1")
+        await writer.close()
+        await reader.close()
+        return job, loaded
+
+    job, loaded = asyncio.run(scenario())
+    assert loaded is not job
+    assert loaded.status == "running"
+    assert loaded.progress == 45 and type(loaded.progress) is int
+    assert loaded.agents == {"Imaging_Feature_Agent": {"status": "done", "output": {"mta_score": 3}}}
+    assert type(loaded.agents["Imaging_Feature_Agent"]["output"]["mta_score"]) is int
+    assert loaded.result == {"hippocampal_volumes": {"left_ml": 2.75}}
+    assert type(loaded.result["hippocampal_volumes"]["left_ml"]) is float
+    assert loaded.error is None
+    assert loaded.created_at == job.created_at and type(loaded.created_at) is float
+
+
+def test_get_falls_back_to_redis_for_jobs_unknown_locally(redis_server):
+    async def scenario():
+        writer = JobStore(redis_url="redis://test")
+        reader = JobStore(redis_url="redis://test")
+        await writer.add("job-1", Job())
+        writer["job-1"].status = "completed"
+        await writer.save("job-1")
+        found = await reader.get("job-1")
+        missing = await reader.get("job-2")
+        await writer.close()
+        await reader.close()
+        return found, missing
+
+    found, missing = asyncio.run(scenario())
+    assert found is not None and found.status == "completed"
+    assert missing is None
+
+
+def test_get_without_redis_only_sees_local_jobs():
+    async def scenario():
+        store = JobStore()
+        await store.add("job-1", Job())
+        found = await store.get("job-1")
+        missing = await store.get("job-2")
+        await store.close()
+        return store, found, missing
+
+    store, found, missing = asyncio.run(scenario())
+    assert found is store["job-1"]
+    assert missing is None
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Monotonic clock for the job store that only moves when advanced"""
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(jobs_module, "time", SimpleNamespace(monotonic=lambda: clock.now, time=time.time))
+    return clock
+
+
+def _add_jobs(store, statuses):
+    async def add_all():
+        for job_id, status in statuses.items():
+            await store.add(job_id, Job(status=status))
+    asyncio.run(add_all())
+
+
+def _present(store, job_ids):
+    async def lookup():
+        return [job_id for job_id in job_ids if await store.get(job_id) is not None]
+    return asyncio.run(lookup())
+
+
+def test_finished_jobs_are_dropped_oldest_first(clock):
+    store = JobStore(max_jobs=2)
+    _add_jobs(store, {"a": "completed", "b": "failed", "c": "completed"})
+    assert _present(store, "abc") == ["b", "c"]
+
+    _add_jobs(store, {"d": "completed"})
+    assert _present(store, "abcd") == ["c", "d"]
+
+
+def test_finished_jobs_expire_after_ttl(clock):
+    store = JobStore(ttl_seconds=60)
+    _add_jobs(store, {"a": "completed"})
+    clock.now += 30
+    _add_jobs(store, {"b": "completed"})
+    clock.now += 31
+    assert _present(store, "ab") == ["b"]
+    clock.now += 30
+    assert _present(store, "ab") == []
+
+
+def test_running_jobs_survive_both_limits(clock):
+    store = JobStore(ttl_seconds=60, max_jobs=1)
+    _add_jobs(store, {"a": "running", "b": "queued", "c": "completed"})
+    clock.now += 120
+    assert _present(store, "abc") == ["a", "b"]
+
+    # Once its pipeline finishes, a job is evictable again
+    store["a"].status = "completed"
+    assert _present(store, "abc") == ["b"]
+
+
+def test_running_jobs_at_the_head_do_not_use_up_excess(clock):
+    store = JobStore(max_jobs=3)
+    _add_jobs(store, {"r1": "running", "r2": "running"})
+    for job_id in ("f1", "f2", "f3", "f4"):
+        _add_jobs(store, {job_id: "completed"})
+        assert len(_present(store, ["r1", "r2", "f1", "f2", "f3", "f4"])) == 3
+    assert _present(store, ["r1", "r2", "f1", "f2", "f3", "f4"]) == ["r1", "r2", "f4"]
+
+    _add_jobs(store, {"f5": "completed", "f6": "completed"})
+    store["r2"].status = "completed"
+    _add_jobs(store, {"f7": "completed"})
+    assert _present(store, ["r1", "r2", "f5", "f6", "f7"]) == ["r1", "f6", "f7"]
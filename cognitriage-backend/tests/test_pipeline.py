@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from app import main
+from app.jobs import Job
+
+
+def test_failed_agent_cancels_its_siblings():
+    async def scenario():
+        job_id = main._new_job_id()
+        await main.jobs.add(job_id, main._init_job(["Failing_Agent", "Slow_Agent"]))
+
+        async def fail():
+            raise ValueError("bad input")
+
+        with pytest.raises(ValueError):
+            await main._gather_agents(
+                main._run_agent(job_id, "Failing_Agent", fail(), 15),
+                main._run_agent(job_id, "Slow_Agent", asyncio.sleep(0.05, "output"), 30),
+            )
+        await asyncio.sleep(0.1)
+        return main.jobs[job_id]
+
+    job: Job = asyncio.run(scenario())
+    assert job.agents["Slow_Agent"]["status"] == "running"
+    assert job.progress == 0